@@ -2,7 +2,6 @@ import collections
 import csv
 
 from . import LanguageModel
-import numpy as np
 
 
 class NaiveBayesClassifier:
@@ -65,7 +64,7 @@ class NaiveBayesClassifier:
                 most_prob, second_most_prob = sorted_probs[0:2]
                 diff = abs(probs[most_prob] - probs[second_most_prob])
 
-                mean_abs_log_prob = abs(np.mean(list(probs.values())))
+                mean_abs_log_prob = abs(sum(probs.values()) / len(probs))
                 if diff / mean_abs_log_prob < prediction_thres:
                     predicted_class = "undefined"
                 else:
@@ -83,7 +82,7 @@ class NaiveBayesClassifier:
 
             diff = abs(probs[most_prob] - probs[second_most_prob])
 
-            mean_abs_log_prob = abs(np.mean(list(probs.values())))
+            mean_abs_log_prob = abs(sum(probs.values()) / len(probs))
             if diff / mean_abs_log_prob < prediction_thres:
                 predicted_class = "undefined"
             else:
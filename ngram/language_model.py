@@ -1,14 +1,87 @@
 import os
 import _pickle as pickle
 import re
-import csv
 import math
+import multiprocessing
+import sys
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
 from nltk.stem import PorterStemmer
-from nltk.corpus import stopwords
 from copy import copy
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from .nested_dict import NestedDict
-from .utils import preprocess_sentence
+from .utils import (
+    english_stopwords,
+    everygrams,
+    ngrams,
+    preprocess_sentence,
+    read_corpus,
+)
+
+# Magic number at the start of zstandard compressed files
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def flatten_nested_model(model, depth, prefix=()):
+    """
+    Description:    function that converts an n-gram model stored as a
+                    NestedDict into pairs of word tuples and counts
+
+    Input:
+    -model:         NestedDict, the n-gram model with nested words
+    -depth:         int, the order of the n-gram model
+    -prefix:        tuple, the words leading to this level of the model
+                    (default: ())
+
+    Output:
+    -pairs:         iterator, yields tuples of words and their counts
+    """
+    for word, value in model.items():
+        if depth == 1:
+            yield prefix + (word,), value
+        else:
+            yield from flatten_nested_model(value, depth - 1, prefix + (word,))
+
+
+# Number of sentences sent to a worker process at once
+SHARD_SIZE = 10000
+
+# The LanguageModel whose corpus is counted by a worker process
+_worker_model = None
+
+
+def _init_worker(model):
+    """
+    Description:    function that stores the LanguageModel in a worker
+                    process, so it is only sent once instead of with
+                    every shard
+
+    Input:
+    -model:         LanguageModel, the model whose corpus is counted
+    """
+    global _worker_model
+    _worker_model = model
+
+
+def _count_shard(args):
+    """
+    Description:    function that counts the n-grams of a shard of
+                    sentences in a worker process
+
+    Input:
+    -args:          tuple, contains the list of sentences and the order
+                    of the model
+
+    Output:
+    -counter:       Counter, the counts of the n-grams of the shard
+    """
+    sentences, N = args
+    return _worker_model.count_ngrams(sentences, N)
 
 
 class LanguageModel:
@@ -24,6 +97,7 @@ class LanguageModel:
         stopword_removal=False,
         preprocess_params={},
         model_file="",
+        processes=1,
     ):
         """
         Description:        constructor for an n-gram LanguageModel
@@ -45,26 +119,27 @@ class LanguageModel:
                             indicates the filename of a previously
                             constructed language model which will be
                             loaded if specified
+        -processes:         int, the number of processes used to count
+                            the n-grams of the training corpus
+                            (default: 1)
         """
         self.Class = Class
         if source:
             self.words = words
-            self.stemmer = PorterStemmer() if stemming else None
-            if stopword_removal:
-                self.stopwords_english = stopwords.words("english")
-            else:
-                self.stopwords_english = None
+            self._init_modifications(stemming, stopword_removal)
             self.preprocess_params = preprocess_params
-            self.models = self.make_models(source, N)
+            self.models = self.make_models(source, N, processes=processes)
+            self._cache_statistics()
         elif model_file:
-            with open(model_file, "rb") as f:
-                [
-                    self.words,
-                    self.stemmer,
-                    self.stopwords_english,
-                    self.models,
-                    self.preprocess_params
-                ] = pickle.load(f)
+            [
+                self.words,
+                stemming,
+                stopword_removal,
+                self.models,
+                self.preprocess_params
+            ] = self.load_models(model_file)
+            self._init_modifications(stemming, stopword_removal)
+            self._cache_statistics()
 
     def __repr__(self):
         """
@@ -88,7 +163,85 @@ class LanguageModel:
         object_string = f"LanguageModel({param_string})"
         return object_string
 
-    def make_models(self, filename, N):
+    def _init_modifications(self, stemming, stopword_removal):
+        """
+        Description:    function that creates the stemmer and the set of
+                        stopwords used to modify sentences
+
+        Input:
+        -stemming:          bool, indicates whether the words are to be
+                            stemmed
+        -stopword_removal:  bool, indicates whether stopwords are
+                            removed
+        """
+        self.stemmer = PorterStemmer() if stemming else None
+        self._stem = self._cache_stemmer(self.stemmer)
+        self.stopwords_english = english_stopwords() if stopword_removal else None
+
+    def __getstate__(self):
+        """
+        Description:    function that returns the state of the instance
+                        to be pickled, without the cached stemmer
+
+        Output:
+        -state:         dict, the attributes of the instance
+        """
+        state = self.__dict__.copy()
+        state.pop("_stem", None)
+        return state
+
+    def __setstate__(self, state):
+        """
+        Description:    function that restores the state of an unpickled
+                        instance and recreates the cached stemmer
+
+        Input:
+        -state:         dict, the attributes of the instance
+        """
+        self.__dict__.update(state)
+        if "stemmer" in state:
+            self._stem = self._cache_stemmer(self.stemmer)
+
+    @staticmethod
+    def _cache_stemmer(stemmer):
+        """
+        Description:    function that wraps the stem function of a
+                        stemmer in a cache, since the same words are
+                        stemmed over and over again
+
+        Input:
+        -stemmer:       PorterStemmer, the stemmer to be cached
+
+        Output:
+        -stem:          function, the cached stem function, or None if
+                        no stemmer is given
+        """
+        return lru_cache(maxsize=None)(stemmer.stem) if stemmer else None
+
+    def count_ngrams(self, sentences, N):
+        """
+        Description:    function that counts the n-grams of orders 1
+                        until N in the given sentences
+
+        Input:
+        -sentences:     iterable, contains the sentences to be counted
+        -N:             int, the order of the model
+
+        Output:
+        -counter:       Counter, maps tuples of words to their counts
+        """
+        counter = Counter()
+        for line in sentences:
+            line = preprocess_sentence(
+                line, return_tokens=True, **self.preprocess_params
+            )
+            line = self.apply_modifications(line)
+            # Intern the words, so all n-grams share one string per word
+            line = list(map(sys.intern, line))
+            counter.update(everygrams(line, N))
+        return counter
+
+    def make_models(self, filename, N, processes=1):
         """
         Description:    function that constructs the n-gram model for a
                         given order and a given corpus directory
@@ -97,36 +250,66 @@ class LanguageModel:
         -filename:      str, the name of the file containing the
                         training corpus for the n-gram model
         -N:             int, the order of the model
+        -processes:     int, the number of processes used to count the
+                        n-grams, the corpus is split into shards that
+                        are counted in parallel if more than 1
+                        (default: 1)
 
         Output:
         -models:        list, contains n-gram models from order 1
                         until N, constructed from text files from a
-                        corpus directory
-        """
-        models = [NestedDict() for _ in range(N)]
-        with open(filename, newline="", encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile)
-            
-            # Skip header
-            next(reader)
-            for row in reader:
-                line = row[0]
-                line = preprocess_sentence(line, **self.preprocess_params)
-                line = self.apply_modifications(line)
-                for j in range(1, N + 1):
-                    for i in range(j, len(line) + 1):
-                        words = line[i - j : i]
-                        models[j - 1].add_by_path(words, 1)
+                        corpus directory, each model is a dict that
+                        maps tuples of words to their counts
+        """
+        sentences = read_corpus(filename)
+        if processes > 1:
+            shards = iter(lambda: list(islice(sentences, SHARD_SIZE)), [])
+            counter = Counter()
+            with multiprocessing.Pool(
+                processes, initializer=_init_worker, initargs=(self,)
+            ) as pool:
+                for shard_counter in pool.imap(
+                    _count_shard, ((shard, N) for shard in shards)
+                ):
+                    # Unpickled keys hold new strings, intern them again
+                    # so all shards share one string per word
+                    for words, count in shard_counter.items():
+                        counter[tuple(map(sys.intern, words))] += count
+        else:
+            counter = self.count_ngrams(sentences, N)
+
+        # Store the counts of each order in a dict keyed by n-gram tuples
+        models = [{} for _ in range(N)]
+        for words, count in counter.items():
+            models[len(words) - 1][words] = count
         return models
 
+    def _cache_statistics(self):
+        """
+        Description:    function that stores the vocabulary size and the
+                        total count of the unigram model, so they do not
+                        have to be recomputed for every relative
+                        frequency, and precomputes the log relative
+                        frequencies of all n-grams seen in training
+        """
+        self._voc_size = len(self.models[0])
+        self._unigram_total = sum(self.models[0].values())
+        self._log_probs = [
+            {
+                words: math.log(self.get_relative_freq(self.models, words))
+                for words in model
+            }
+            for model in self.models
+        ]
+
     def get_relative_freq(self, models, words, alpha=1.0):
         """
         Description:    function that computes the relative frequency
                         for a given list of words
 
         Input:
-        -models:        list, contains n-gram models from order
-                        1 until N
+        -models:        list, contains n-gram models of this language
+                        model from order 1 until N
         -words:         list, words for which the relative frequency
                         will be computed
         -alpha:         float, the number used for additive smoothing
@@ -136,15 +319,16 @@ class LanguageModel:
         -relative_freq: float, the relative frequency of the list of
                         words according to the n-gram model
         """
+        words = tuple(words)
         length = len(words)
-        voc_size = len(models[0].values())
+        voc_size = self._voc_size
         if length == 1:
-            relative_freq = (models[0].get_by_path(words) + alpha) / float(
-                sum(models[0].values()) + alpha * voc_size
+            relative_freq = (models[0].get(words, 0) + alpha) / float(
+                self._unigram_total + alpha * voc_size
             )
         else:
-            ngram_freq = models[length - 1].get_by_path(words)
-            n_min_one_freq = models[length - 2].get_by_path(words[:-1])
+            ngram_freq = models[length - 1].get(words, 0)
+            n_min_one_freq = models[length - 2].get(words[:-1], 0)
             relative_freq = (ngram_freq + alpha) / float(
                 n_min_one_freq + alpha * voc_size
             )
@@ -156,16 +340,19 @@ class LanguageModel:
                         stemming and stopword removal if appropriate
 
         Input:
-        -sentence:      str, sentence to be preprocessed
+        -sentence:      str, sentence to be preprocessed, or a list of
+                        its words
 
         Output:
-        -sentence:      str, the preprocessed sentence
+        -sentence:      list, the words or characters of the
+                        preprocessed sentence
         """
+        words = sentence.split() if isinstance(sentence, str) else sentence
         if self.stopwords_english:
-            sentence = " ".join([word for word in sentence.split() if word not in self.stopwords_english])
+            words = [word for word in words if word not in self.stopwords_english]
         if self.stemmer:
-            sentence = " ".join([self.stemmer.stem(word) for word in sentence.split()])
-        sentence = sentence.split() if self.words else list(sentence)
+            words = [self._stem(word) for word in words]
+        sentence = words if self.words else list(" ".join(words))
         sentence = ["<s>"] + sentence + ["</s>"]
         return sentence
 
@@ -183,17 +370,47 @@ class LanguageModel:
         Output:
         -sentence_prob:     float, the log probability of the sentence
         """
-        sentence = preprocess_sentence(sentence, **self.preprocess_params)
+        sentence = preprocess_sentence(
+            sentence, return_tokens=True, **self.preprocess_params
+        )
         sentence = self.apply_modifications(sentence)
-        sentence_prob = 1
+        sentence_prob = 0.0
         if not N:
             N = len(self.models)
-        for i in range(1, len(sentence) + 1):
-            words = sentence[0:i] if i - N < 0 else sentence[i - N : i]
-            relative_freq = self.get_relative_freq(self.models[:N], words)
-            sentence_prob += math.log(relative_freq)
+        # The first words have fewer preceding words than the order
+        for i in range(1, min(N, len(sentence) + 1)):
+            sentence_prob += self.get_log_prob(sentence[:i], N)
+        log_probs = self._log_probs[N - 1]
+        for words in ngrams(sentence, N):
+            log_prob = log_probs.get(words)
+            if log_prob is None:
+                # Unseen n-grams fall back to the smoothed relative frequency
+                relative_freq = self.get_relative_freq(self.models[:N], words)
+                log_prob = math.log(relative_freq)
+            sentence_prob += log_prob
         return sentence_prob
 
+    def get_log_prob(self, words, N):
+        """
+        Description:    function that returns the log relative frequency
+                        of a list of words, using the precomputed value
+                        for n-grams seen during training
+
+        Input:
+        -words:         list, words for which the log relative frequency
+                        will be returned
+        -N:             int, the order of n-gram model that is used
+
+        Output:
+        -log_prob:      float, the log relative frequency of the words
+        """
+        words = tuple(words)
+        log_prob = self._log_probs[len(words) - 1].get(words)
+        if log_prob is None:
+            # Unseen n-grams fall back to the smoothed relative frequency
+            log_prob = math.log(self.get_relative_freq(self.models[:N], words))
+        return log_prob
+
     def get_class(self):
         """
         Description:    returns the class of the model object
@@ -213,7 +430,44 @@ class LanguageModel:
         """
         return self.models
 
-    def save_models(self, filename):
+    @staticmethod
+    def load_models(filename):
+        """
+        Description:    loads the n-gram models and parameters from a
+                        file stored with save_models, which may be
+                        compressed with zstandard
+
+        Input:
+        -filename:      str, the name of the file in which the data is
+                        stored
+
+        Output:
+        -data:          list, contains the parameters and the n-gram
+                        models
+        """
+        with open(filename, "rb") as f:
+            if f.read(len(ZSTD_MAGIC)) != ZSTD_MAGIC:
+                f.seek(0)
+                data = pickle.load(f)
+            elif zstandard is None:
+                raise ImportError(
+                    f"{filename} is compressed, loading it requires zstandard"
+                )
+            else:
+                f.seek(0)
+                with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                    data = pickle.load(reader)
+
+        # Files stored before the models were flattened hold NestedDicts
+        data[3] = [
+            dict(flatten_nested_model(model, j))
+            if isinstance(model, NestedDict)
+            else model
+            for j, model in enumerate(data[3], 1)
+        ]
+        return data
+
+    def save_models(self, filename, compress=False):
         """
         Description:    stores the n-gram models and parameters in a
                         pickled file that can be loaded later into a
@@ -222,8 +476,25 @@ class LanguageModel:
         Input:
         -filename:      str, the name of the file in which the data will
                         be stored
+        -compress:      bool, indicates whether the file is compressed
+                        with zstandard, which must be installed
+                        (default: False)
         """
+        # The stemmer and stopwords are stored as flags and recreated
+        # when the file is loaded
+        data = [
+            self.words,
+            bool(self.stemmer),
+            bool(self.stopwords_english),
+            self.models,
+            self.preprocess_params,
+        ]
+        if compress and zstandard is None:
+            raise ImportError("compressing models requires zstandard")
         with open(filename, "wb") as f:
-            pickle.dump(
-                [self.words, self.stemmer, self.stopwords_english, self.models, self.preprocess_params], f
-            )
+            if compress:
+                compressor = zstandard.ZstdCompressor(level=3, threads=-1)
+                with compressor.stream_writer(f, closefd=False) as writer:
+                    pickle.dump(data, writer, protocol=-1)
+            else:
+                pickle.dump(data, f, protocol=-1)
@@ -1,4 +1,72 @@
+import csv
+import itertools
 import re
+from functools import lru_cache
+from nltk.corpus import stopwords
+
+# Sub-patterns of the preprocessing steps, in the order they are applied
+_LINK = r"https?:\/\/[^\s]*|www\.[^\s]*"
+# Emails always start at the beginning of a word, anchoring them there
+# avoids rescanning the word from every position in it
+_EMAIL = r"(?<![^\s])[^\s@]*@[^\s]*"
+_BREAK = r"(?<=[^\s])[\/-](?=[^\s])"
+# Links are removed first, so later steps must not see into them
+_NOT_LINK = r"(?!https?:\/\/|www\.)"
+_EMAIL_BEFORE_LINK = rf"(?<![^\s])(?:{_NOT_LINK}[^\s@])*@[^\s]*"
+_BREAK_BEFORE_LINK = rf"{_BREAK}{_NOT_LINK}"
+_NON_ALPHANUMERIC = r"[^a-z0-9\s]"
+
+
+def _compile_pattern(remove_links, remove_emails, break_words, alphanumeric_only):
+    """
+    Description:    function that fuses the sub-patterns of the enabled
+                    preprocessing steps into a single compiled pattern
+
+    Input:
+    -remove_links:      bool, whether website links are removed
+    -remove_emails:     bool, whether emails and mentions are removed
+    -break_words:       bool, whether slashed and hyphenated words are
+                        broken up
+    -alphanumeric_only: bool, whether non alphanumeric characters are
+                        removed
+
+    Output:
+    -pattern:       re.Pattern, the fused pattern, or None if no
+                    step is enabled
+    """
+    alternatives = []
+    if remove_links:
+        alternatives.append(f"(?P<link>{_LINK})")
+    if remove_emails:
+        email = _EMAIL_BEFORE_LINK if remove_links else _EMAIL
+        alternatives.append(f"(?P<email>{email})")
+    if break_words:
+        brk = _BREAK_BEFORE_LINK if remove_links else _BREAK
+        alternatives.append(f"(?P<brk>{brk})")
+    if alphanumeric_only:
+        alternatives.append(f"(?P<nonalnum>{_NON_ALPHANUMERIC})")
+    return re.compile("|".join(alternatives)) if alternatives else None
+
+
+# Fused patterns for every combination of preprocessing steps
+_PATTERNS = {
+    flags: _compile_pattern(*flags)
+    for flags in itertools.product((False, True), repeat=4)
+}
+
+
+def _replace(match):
+    """
+    Description:    function that returns the replacement for a match of
+                    a fused preprocessing pattern
+
+    Input:
+    -match:         re.Match, the match of the fused pattern
+
+    Output:
+    -replacement:   str, a space for broken up words, else nothing
+    """
+    return " " if match.lastgroup == "brk" else ""
 
 
 def preprocess_sentence(
@@ -8,6 +76,7 @@ def preprocess_sentence(
     remove_emails=True,
     break_words=True,
     alphanumeric_only=True,
+    return_tokens=False,
 ):
     """
     Description:    function that preprocesses a sentence before it
@@ -15,26 +84,103 @@ def preprocess_sentence(
 
     Input:
     -sentence:      str, the sentence to be preprocessed
+    -return_tokens: bool, indicates whether the words of the sentence
+                    are returned instead of the sentence
+                    (default: False)
 
     Output:
-    -sentence:      str, the sentence after preprocessing
+    -sentence:      str, the sentence after preprocessing, or a list of
+                    its words if return_tokens is set
 
     """
     if lower:
         sentence = sentence.lower()
-    if remove_links:
-        # Remove website links
-        sentence = re.sub(r"(https?:\/\/(www)?[^\s]*)|(www\.[^\s]*)", "", sentence)
-    if remove_emails:
-        # Remove twitter mentions and email addresses
-        sentence = re.sub(r"[^\s]*@[^\s]*", "", sentence)
-    if break_words:
-        # Break up slashed and hyphenated words
-        sentence = re.sub(r"(?<=[^\s])(\/|-)(?=[^\s])", " ", sentence)
-    if alphanumeric_only:
-        # Remove all non alphanumeric characters
-        sentence = re.sub(r"[^a-z0-9\s]", "", sentence)
-        
+    flags = (remove_links, remove_emails, break_words, alphanumeric_only)
+    pattern = _PATTERNS[tuple(map(bool, flags))]
+    if pattern:
+        # Apply all enabled steps in a single scan over the sentence
+        sentence = pattern.sub(_replace, sentence)
+
+    if return_tokens:
+        return sentence.split()
     # Split and join with a single space between words
     sentence = " ".join(sentence.split())
     return sentence
+
+
+@lru_cache(maxsize=1)
+def english_stopwords():
+    """
+    Description:    function that returns the English stopwords of NLTK,
+                    which are read from disk only once and shared by all
+                    LanguageModel instances
+
+    Output:
+    -stopwords:     frozenset, contains the English stopwords
+    """
+    return frozenset(stopwords.words("english"))
+
+
+def read_corpus(filename):
+    """
+    Description:    function that reads the sentences from the first
+                    column of a csv file with a header, only handing
+                    rows that contain quotes to the csv parser
+
+    Input:
+    -filename:      str, the name of the csv file containing the corpus
+
+    Output:
+    -sentences:     iterator, yields the sentences of the corpus
+    """
+    with open(filename, newline="", encoding="utf-8") as csvfile:
+        # Skip header, an empty file contains no sentences
+        if next(csv.reader(csvfile), None) is None:
+            return
+        for line in csvfile:
+            if '"' in line:
+                # Quoted fields can contain commas and newlines, the
+                # parser reads as many lines as the row spans
+                row = next(csv.reader(itertools.chain([line], csvfile)))
+                sentence = row[0]
+            else:
+                sentence = line.rstrip("\r\n").split(",", 1)[0]
+            yield sentence
+
+
+def ngrams(tokens, n):
+    """
+    Description:    function that enumerates all contiguous n-grams of
+                    a given order in a sequence of tokens
+
+    Input:
+    -tokens:        list, the tokens from which the n-grams are taken
+    -n:             int, the order of the n-grams
+
+    Output:
+    -ngrams:        iterator, yields the n-grams as tuples of tokens
+    """
+    return zip(tokens, *[tokens[i:] for i in range(1, n)])
+
+
+def everygrams(tokens, max_n):
+    """
+    Description:    function that enumerates all contiguous n-grams of
+                    orders 1 until max_n in a sequence of tokens, in a
+                    single walk that shares the shifted views of the
+                    tokens between all orders
+
+    Input:
+    -tokens:        list, the tokens from which the n-grams are taken
+    -max_n:         int, the highest order of the n-grams
+
+    Output:
+    -everygrams:    iterator, yields the n-grams as tuples of tokens,
+                    ordered by increasing order
+    """
+    # The tokens themselves serve as the unshifted view, only the shifted
+    # views are copied
+    shifted = [tokens] + [tokens[i:] for i in range(1, max_n)]
+    return itertools.chain.from_iterable(
+        zip(*shifted[:n]) for n in range(1, max_n + 1)
+    )
@@ -1,7 +1,8 @@
-from ngram.nested_dict import NestedDict
 from ngram.language_model import LanguageModel
 import pytest
 import os
+import math
+import pickle
 
 
 # TODO add test for unicode chars
@@ -19,46 +20,111 @@ class TestLanguageModel:
 
     def test_init_from_source_corpus(self):
         correct = [
-            NestedDict(
-                {
-                    "<s>": 2,
-                    "wow": 1,
-                    "this": 1,
-                    "is": 1,
-                    "great": 2,
-                    "</s>": 2,
-                    "what": 1,
-                    "a": 1,
-                    "story": 1,
-                }
-            ),
-            NestedDict(
-                {
-                    "<s>": {"wow": 1, "what": 1},
-                    "wow": {"this": 1},
-                    "this": {"is": 1},
-                    "is": {"great": 1},
-                    "great": {"</s>": 1, "story": 1},
-                    "what": {"a": 1},
-                    "a": {"great": 1},
-                    "story": {"</s>": 1},
-                }
-            ),
+            {
+                ("<s>",): 2,
+                ("wow",): 1,
+                ("this",): 1,
+                ("is",): 1,
+                ("great",): 2,
+                ("</s>",): 2,
+                ("what",): 1,
+                ("a",): 1,
+                ("story",): 1,
+            },
+            {
+                ("<s>", "wow"): 1,
+                ("<s>", "what"): 1,
+                ("wow", "this"): 1,
+                ("this", "is"): 1,
+                ("is", "great"): 1,
+                ("great", "</s>"): 1,
+                ("great", "story"): 1,
+                ("what", "a"): 1,
+                ("a", "great"): 1,
+                ("story", "</s>"): 1,
+            },
         ]
         for i, model in enumerate(self.LM_pos.get_models()):
             assert model == correct[i]
 
+    def test_init_multiple_processes(self):
+        path = os.path.join(
+            os.getcwd(), "tests/unittest_corpora/processed/positive_training.csv"
+        )
+        LM_parallel = LanguageModel(
+            "positive", source=path, stemming=False, processes=2
+        )
+
+        assert LM_parallel.get_models() == self.LM_pos.get_models()
+
     def test_save_model_and_init_from_model_file(self):
         self.LM_pos.save_models(self.test_model_path)
         new_model = LanguageModel("positive", model_file=self.test_model_path)
 
         assert new_model.__dict__ == self.LM_pos.__dict__
 
+    def test_init_from_baseline_model_file(self):
+        # Model file stored before the models were flattened
+        model_path = os.path.join(
+            os.getcwd(), "tests/unittest_models/baseline_model.p"
+        )
+        old_model = LanguageModel("positive", model_file=model_path)
+
+        assert old_model.get_models() == self.LM_pos.get_models()
+        assert old_model.compute_prob("what a story") == pytest.approx(
+            self.LM_pos.compute_prob("what a story")
+        )
+
+    def test_save_compressed_model(self, tmp_path):
+        pytest.importorskip("zstandard")
+        model_path = tmp_path / "compressed_model.p"
+        self.LM_pos.save_models(model_path, compress=True)
+        new_model = LanguageModel("positive", model_file=model_path)
+
+        assert new_model.__dict__ == self.LM_pos.__dict__
+
+    def test_compute_prob(self):
+        sentence = ["<s>", "what", "a", "great", "movie", "</s>"]
+        correct = sum(
+            math.log(
+                self.LM_pos.get_relative_freq(
+                    self.LM_pos.get_models(), sentence[max(i - 2, 0) : i]
+                )
+            )
+            for i in range(1, len(sentence) + 1)
+        )
+
+        assert self.LM_pos.compute_prob("What a great movie!") == pytest.approx(
+            correct
+        )
+
     def test_init_N(self):
         pass
 
-    def test_init_stemming(self):
-        pass
+    def test_init_stemming(self, tmp_path):
+        path = os.path.join(
+            os.getcwd(), "tests/unittest_corpora/processed/negative_training.csv"
+        )
+        LM_neg = LanguageModel("negative", source=path, N=1, stemming=True)
+
+        assert LM_neg.get_models()[0][("movi",)] == 1
+        assert LM_neg.get_models()[0][("actor",)] == 1
+
+        unpickled = pickle.loads(pickle.dumps(LM_neg))
+
+        assert unpickled.apply_modifications("great actors") == [
+            "<s>",
+            "great",
+            "actor",
+            "</s>",
+        ]
+
+        model_path = tmp_path / "stemmed_model.p"
+        LM_neg.save_models(model_path)
+        loaded = LanguageModel("negative", model_file=model_path)
+
+        assert repr(loaded) == repr(LM_neg)
+        assert loaded.apply_modifications("actors") == ["<s>", "actor", "</s>"]
 
     def test_init_stopword_removal(self):
         pass
@@ -1,4 +1,4 @@
-from ngram.utils import preprocess_sentence
+from ngram.utils import everygrams, ngrams, preprocess_sentence, read_corpus
 import pytest
 
 
@@ -33,6 +33,13 @@ class TestUtils:
 
         assert result == "tes"
 
+    def test_preprocess_long_words(self):
+        sentence = "a" * 100000 + " te@st " + "b-" * 50000
+
+        result = preprocess_sentence(sentence)
+
+        assert result == "a" * 100000 + " " + "b " * 49999 + "b"
+
     def test_preprocess_slashed_and_hyphenated(self):
         sentence = """
         him/her
@@ -52,3 +59,85 @@ class TestUtils:
         result = preprocess_sentence(sentence)
 
         assert result == "willbe removed multiple spaces test gooedaal"
+
+    def test_preprocess_links_before_other_steps(self):
+        # Links are removed first, words are not broken up or removed as
+        # emails because of a link that follows them
+        result = preprocess_sentence("see-http://x.com now", alphanumeric_only=False)
+
+        assert result == "see- now"
+
+        result = preprocess_sentence("!!http://1ax@y now", alphanumeric_only=False)
+
+        assert result == "!! now"
+
+    def test_preprocess_emails_without_link_removal(self):
+        sentence = "!!http://1ax@y now"
+        result = preprocess_sentence(
+            sentence, remove_links=False, alphanumeric_only=False
+        )
+
+        assert result == "now"
+
+        sentence = "go-on http://x@y.com/a-b now"
+        result = preprocess_sentence(sentence, remove_links=False)
+
+        assert result == "go on now"
+
+    def test_preprocess_adversarial_links_and_emails(self):
+        assert preprocess_sentence("@" * 100000) == ""
+        assert preprocess_sentence("http://" * 20000) == ""
+        assert preprocess_sentence("a" * 100000 + "http://b@c") == "a" * 100000
+        assert preprocess_sentence("a@" * 50000, remove_links=False) == ""
+        assert preprocess_sentence("www." * 30000, remove_emails=False) == ""
+
+    def test_preprocess_return_tokens(self):
+        sentence = """
+        Some    WORDS, split-up
+        """
+        result = preprocess_sentence(sentence, return_tokens=True)
+
+        assert result == ["some", "words", "split", "up"]
+
+    def test_ngrams(self):
+        tokens = ["<s>", "a", "b", "</s>"]
+
+        assert list(ngrams(tokens, 1)) == [("<s>",), ("a",), ("b",), ("</s>",)]
+        assert list(ngrams(tokens, 2)) == [("<s>", "a"), ("a", "b"), ("b", "</s>")]
+        assert list(ngrams(tokens, 5)) == []
+
+    def test_everygrams(self):
+        tokens = ["<s>", "a", "</s>"]
+
+        assert list(everygrams(tokens, 2)) == [
+            ("<s>",),
+            ("a",),
+            ("</s>",),
+            ("<s>", "a"),
+            ("a", "</s>"),
+        ]
+
+    def test_read_corpus(self, tmp_path):
+        path = tmp_path / "corpus.csv"
+        path.write_text(
+            'text,sentiment\r\n'
+            'plain sentence,positive\r\n'
+            '"quoted, with comma",negative\r\n'
+            '"spans\r\ntwo lines",positive\r\n'
+            'last one,negative\r\n',
+            encoding="utf-8",
+            newline="",
+        )
+
+        assert list(read_corpus(path)) == [
+            "plain sentence",
+            "quoted, with comma",
+            "spans\r\ntwo lines",
+            "last one",
+        ]
+
+    def test_read_empty_corpus(self, tmp_path):
+        path = tmp_path / "empty.csv"
+        path.write_text("", encoding="utf-8")
+
+        assert list(read_corpus(path)) == []